@@ -1,19 +1,90 @@
-from typing import Self
+from typing import Self, Callable, Hashable, Iterable, Iterator, NamedTuple
 from pathlib import Path
+import os
+import sys
+import hashlib
 import shutil
-from fnmatch import fnmatch
+import stat
+import errno
+import re
+from fnmatch import translate
 import time
+import struct
+import json
+import mmap
+from array import array
 from collections import Counter
-from rich.progress import track
+from bisect import bisect_right
+from collections.abc import Sequence
+from itertools import islice, chain
+from contextlib import nullcontext, ExitStack
+from queue import SimpleQueue
+from concurrent.futures import Executor, Future, ThreadPoolExecutor, ProcessPoolExecutor
+from threading import Event, Lock, Thread, local
+from rich.progress import track, Progress, ProgressColumn, Task as ProgressTask, TextColumn, BarColumn, TaskProgressColumn, DownloadColumn, TransferSpeedColumn, TimeRemainingColumn
+from rich.text import Text
+from rich.markup import escape
+
+try:
+    import fcntl
+except ImportError:    # Windows
+    fcntl = None
 
 from rich.logging import RichHandler
+from rich.console import Console
 import logging
+from logging.handlers import QueueHandler, QueueListener
+import atexit
+
+# The records are rendered by a listener thread, so that the walk and the copy never wait on the terminal.
+_log_queue: SimpleQueue[logging.LogRecord] = SimpleQueue()
+_log_listener = QueueListener(_log_queue, RichHandler(rich_tracebacks=True))
 logging.basicConfig(
     level = "INFO",
     format = "%(message)s",
-    handlers = [RichHandler(rich_tracebacks=True)]
+    handlers = [QueueHandler(_log_queue)]
 )
 log = logging.getLogger("rich")
+_log_listener.start()
+
+def _log_directly(handler: logging.Handler) -> None:
+    root = logging.getLogger()
+    for previous in root.handlers[:]:
+        root.removeHandler(previous)
+    root.addHandler(handler)
+
+def _stop_log_listener() -> None:
+    """
+    Render the pending records, then render the next ones directly. Done on exit, and before the traceback
+    of an uncaught error, so that the traceback comes after the records that led to it.
+    """
+    
+    if any(isinstance(handler, QueueHandler) for handler in logging.getLogger().handlers):
+        _log_listener.stop()
+        _log_directly(*_log_listener.handlers)
+
+def _flush_log_listener() -> None:
+    """
+    Render the pending records before a live display starts, which draws from the calling thread,
+    so that the display never comes before, or is broken by, the records logged ahead of it.
+    """
+    
+    if any(isinstance(handler, QueueHandler) for handler in logging.getLogger().handlers):
+        _log_listener.stop()
+        _log_listener.start()
+
+def _log_before_traceback(*exc_info) -> None:
+    _stop_log_listener()
+    _excepthook(*exc_info)
+
+_excepthook = sys.excepthook
+sys.excepthook = _log_before_traceback
+atexit.register(_stop_log_listener)
+
+# A forked worker process has no listener, it renders its own records, with its own console: the one of the parent
+# may have been locked by one of its threads when the process was forked.
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=lambda: _log_directly(RichHandler(rich_tracebacks=True, console=Console())))
 
 def _format_execution_time(delta_time: float) -> str:
     if delta_time < 1:
@@ -29,6 +100,13 @@ def _format_execution_time(delta_time: float) -> str:
     h, m = divmod(delta_time, 3600)
     return f"{int(h)}H {int(m/60)}M"
 
+def _format_size(size: int) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            return f"{size:g} {unit}"
+        size /= 1024
+    return f"{size:g} TB"
+
 def _timed(phase_name: str):
     def decorator(func):
         def wrapper(*args, **kwargs):
@@ -43,30 +121,1005 @@ def _timed(phase_name: str):
         return wrapper
     return decorator
 
+def _imap_scheduled(func: Callable, queues: dict[Hashable, tuple[Executor, int, Iterable[tuple]]]) -> Iterator:
+    """
+    Submit `func(*args)` for every item of several queues, each `(executor, window, iterable)` keeping at most
+    `window` calls in flight on its own executor, and yield the results in completion order. Each queue is refilled
+    as soon as one of its calls completes, so a slow queue never holds back the others.
+    """
+    
+    done: SimpleQueue[tuple[Hashable, Future]] = SimpleQueue()
+    in_flight: Counter[Hashable] = Counter()
+    pending = {key: (executor, window, iter(iterable)) for key, (executor, window, iterable) in queues.items()}
+    
+    def fill(key: Hashable) -> None:
+        executor, window, iterator = pending[key]
+        while in_flight[key] < window:
+            args = next(iterator, None)
+            if args is None:
+                del pending[key]
+                return
+            
+            executor.submit(func, *args).add_done_callback(lambda future, key=key: done.put((key, future)))
+            in_flight[key] += 1
+    
+    for key in list(pending):
+        fill(key)
+    
+    while in_flight.total():
+        key, future = done.get()
+        in_flight[key] -= 1
+        if key in pending:
+            fill(key)
+        yield future.result()
+
+def _batched(iterable: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+def _nested_pair(paths: list[Path]) -> tuple[int, int] | None:
+    """
+    Find two paths, by index, such that the first is the same as or a parent of the second. Once sorted by parts, the
+    paths under a path directly follow it, so only neighbours need to be compared.
+    """
+    
+    order = sorted(range(len(paths)), key=lambda i: paths[i].parts)
+    for i, j in zip(order, order[1:]):
+        if paths[j].parts[:len(paths[i].parts)] == paths[i].parts:
+            return i, j
+    return None
+
+class _FileStat(NamedTuple):
+    """
+    The part of a source file's `os.stat_result` that the later phases need, captured once during the walk.
+    """
+    
+    size: int
+    mtime_ns: int
+    atime_ns: int
+    mode: int
+    ino: int
+    dev: int
+    blocks: int
+    
+    @classmethod
+    def of(cls, st: os.stat_result) -> Self:
+        blocks = getattr(st, "st_blocks", (st.st_size + 511) // 512)
+        return cls(st.st_size, st.st_mtime_ns, st.st_atime_ns, st.st_mode, st.st_ino, st.st_dev, blocks)
+    
+    @property
+    def allocated(self) -> int:
+        return self.blocks * 512
+    
+    @property
+    def is_sparse(self) -> bool:
+        return self.allocated < self.size
+
+class _NameMatcher:
+    """
+    A set of glob patterns compiled once, matching a file name like `any(fnmatch(name, p) for p in patterns)`.
+    
+    Exact names (`Thumbs.db`) and pure extension patterns (`*.tmp`) are answered by set lookups,
+    every other pattern is folded into a single regular expression. `pattern` tells which pattern
+    a matching name matches, by testing the patterns of the regular expression one by one.
+    """
+    
+    __GLOB_CHARS = re.compile(r"[*?\[]")
+    
+    def __init__(self, patterns: Iterable[str]):
+        self.names: set[str] = set()
+        self.extensions: dict[str, str] = {}
+        self._regex_patterns: list[tuple[str, Callable]] = []
+        
+        for pattern in patterns:
+            pattern = os.path.normcase(pattern)
+            
+            if not self.__GLOB_CHARS.search(pattern):
+                self.names.add(pattern)
+                continue
+            
+            extension = pattern[2:]
+            if pattern.startswith("*.") and "." not in extension and not self.__GLOB_CHARS.search(extension):
+                self.extensions[extension] = pattern
+                continue
+            
+            self._regex_patterns.append((pattern, re.compile(translate(pattern)).match))
+        
+        regex = "|".join(translate(pattern) for pattern, _ in self._regex_patterns)
+        self._regex_match = re.compile(regex).match if regex else None
+    
+    def __call__(self, name: str) -> bool:
+        name = os.path.normcase(name)
+        
+        if name in self.names:
+            return True
+        
+        _, dot, extension = name.rpartition(".")
+        if dot and extension in self.extensions:
+            return True
+        
+        return self._regex_match is not None and self._regex_match(name) is not None
+    
+    def pattern(self, name: str) -> str | None:
+        """
+        The pattern matched by `name`, None if it matches none of them.
+        """
+        
+        name = os.path.normcase(name)
+        
+        if name in self.names:
+            return name
+        
+        _, dot, extension = name.rpartition(".")
+        if dot and extension in self.extensions:
+            return self.extensions[extension]
+        
+        return next((pattern for pattern, match in self._regex_patterns if match(name) is not None), None)
+
+class _IncludeMatcher:
+    """
+    A set of include patterns. A pattern without a `/` is matched against the file name anywhere in the tree,
+    a pattern with a `/` is anchored at the source root and matched segment by segment against the relative path,
+    where a `**` segment matches any number of directories (`data/2024/**/*.parquet`).
+    
+    Anchored patterns also tell which directories can contain a match at all, so the others can be pruned
+    from the walk without being listed.
+    """
+    
+    def __init__(self, patterns: Iterable[str]):
+        name_patterns: list[str] = []
+        self._path_patterns: list[tuple] = []
+        
+        for pattern in patterns:
+            pattern = pattern.replace(os.sep, "/")
+            if "/" not in pattern:
+                name_patterns.append(pattern)
+                continue
+            
+            if pattern.endswith("/"):
+                pattern += "**"
+            segments = [s for s in pattern.split("/") if s not in ("", ".")]
+            self._path_patterns.append(tuple(
+                None if s == "**" else re.compile(translate(os.path.normcase(s))).match
+                for s in segments
+            ))
+        
+        self._name_matcher = _NameMatcher(name_patterns) if name_patterns else None
+    
+    def match(self, parts: tuple[str, ...]) -> bool:
+        """
+        Whether the file at relative path `parts` is included.
+        """
+        
+        if self._name_matcher is not None and self._name_matcher(parts[-1]):
+            return True
+        
+        parts = tuple(os.path.normcase(p) for p in parts)
+        return any(self._match_segments(segments, parts) for segments in self._path_patterns)
+    
+    def may_contain(self, parts: tuple[str, ...]) -> bool:
+        """
+        Whether the directory at relative path `parts` can contain an included file.
+        """
+        
+        if self._name_matcher is not None:
+            return True
+        
+        parts = tuple(os.path.normcase(p) for p in parts)
+        return any(self._match_prefix(segments, parts) for segments in self._path_patterns)
+    
+    @classmethod
+    def _match_segments(cls, segments: tuple, parts: tuple[str, ...]) -> bool:
+        if not segments:
+            return not parts
+        
+        head, rest = segments[0], segments[1:]
+        if head is None:
+            return any(cls._match_segments(rest, parts[i:]) for i in range(len(parts) + 1))
+        
+        return bool(parts) and head(parts[0]) is not None and cls._match_segments(rest, parts[1:])
+    
+    @classmethod
+    def _match_prefix(cls, segments: tuple, parts: tuple[str, ...]) -> bool:
+        if not parts:
+            return bool(segments)
+        
+        if not segments:
+            return False
+        
+        head, rest = segments[0], segments[1:]
+        if head is None:
+            return True
+        
+        return head(parts[0]) is not None and cls._match_prefix(rest, parts[1:])
+
+# ==================== Copy engines ====================
+# Each engine copies the bytes [offset, offset + count) of `src_fd` to the same offset of `dst_fd`,
+# or up to the end of the source if `count` is None, and returns the number of bytes copied.
+# An engine that is not supported for a pair of files raises an OSError with one of `_FALLBACK_ERRNOS`.
+
+_FALLBACK_ERRNOS = {errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EBADF}
+_KERNEL_COPY_BLOCK_SIZE = 1 << 30
+_BUFFERED_COPY_BLOCK_SIZE = 1 << 20
+
+def _copy_with_copy_file_range(src_fd: int, dst_fd: int, offset: int, count: int | None) -> int:
+    copied = 0
+    while count is None or copied < count:
+        block = _KERNEL_COPY_BLOCK_SIZE if count is None else min(count - copied, _KERNEL_COPY_BLOCK_SIZE)
+        n = os.copy_file_range(src_fd, dst_fd, block, offset + copied, offset + copied)
+        if n == 0:
+            break
+        copied += n
+    return copied
+
+def _copy_with_sendfile(src_fd: int, dst_fd: int, offset: int, count: int | None) -> int:
+    os.lseek(dst_fd, offset, os.SEEK_SET)
+    copied = 0
+    while count is None or copied < count:
+        block = _KERNEL_COPY_BLOCK_SIZE if count is None else min(count - copied, _KERNEL_COPY_BLOCK_SIZE)
+        n = os.sendfile(dst_fd, src_fd, offset + copied, block)
+        if n == 0:
+            break
+        copied += n
+    return copied
+
+# One buffer per thread, allocated on its first buffered copy, instead of one per call.
+_copy_buffers = local()
+
+def _copy_with_buffer(src_fd: int, dst_fd: int, offset: int, count: int | None) -> int:
+    buffer = getattr(_copy_buffers, "buffer", None)
+    if buffer is None:
+        buffer = _copy_buffers.buffer = memoryview(bytearray(_BUFFERED_COPY_BLOCK_SIZE))
+    if not hasattr(os, "preadv"):
+        os.lseek(src_fd, offset, os.SEEK_SET)
+        os.lseek(dst_fd, offset, os.SEEK_SET)
+    
+    copied = 0
+    while count is None or copied < count:
+        block = buffer if count is None else buffer[:min(count - copied, len(buffer))]
+        if hasattr(os, "preadv"):
+            n = os.preadv(src_fd, [block], offset + copied)
+        else:
+            data = os.read(src_fd, len(block))
+            n = len(data)
+            block[:n] = data
+        if n == 0:
+            break
+        
+        written = 0
+        while written < n:
+            if hasattr(os, "pwrite"):
+                written += os.pwrite(dst_fd, block[written:n], offset + copied + written)
+            else:
+                written += os.write(dst_fd, block[written:n])
+        copied += n
+    return copied
+
+_COPY_ENGINES: dict[str, Callable[[int, int, int, int | None], int]] = {}
+if hasattr(os, "copy_file_range"):
+    _COPY_ENGINES["copy_file_range"] = _copy_with_copy_file_range
+if hasattr(os, "sendfile") and sys.platform.startswith("linux"):
+    _COPY_ENGINES["sendfile"] = _copy_with_sendfile
+_COPY_ENGINES["buffered"] = _copy_with_buffer
+
+def _copy_range(src_fd: int, dst_fd: int, offset: int, count: int | None, engine: str = "auto") -> str:
+    """
+    Copy a byte range with the given engine, or with the first one that works if `engine` is "auto",
+    and return the name of the engine that copied it.
+    """
+    
+    assert engine == "auto" or engine in _COPY_ENGINES, f"Unknown copy engine {engine}, choose from {list(_COPY_ENGINES)}."
+    
+    names = list(_COPY_ENGINES) if engine == "auto" else [engine]
+    for name in names[:-1]:
+        try:
+            # Some files (e.g. in procfs) report nothing to the kernel copies but can still be read.
+            if _COPY_ENGINES[name](src_fd, dst_fd, offset, count) > 0 or count == 0:
+                return name
+        except OSError as e:
+            if e.errno not in _FALLBACK_ERRNOS:
+                raise
+    
+    _COPY_ENGINES[names[-1]](src_fd, dst_fd, offset, count)
+    return names[-1]
+
+# ==================== Reflink ====================
+# A reflink clones the extents of the source into the destination (copy-on-write), so no data is copied at all.
+# It only works within one filesystem that supports it (btrfs, XFS, ...), which "auto" probes once per device pair.
+
+_FICLONE = 0x40049409
+_REFLINK_FALLBACK_ERRNOS = {errno.EOPNOTSUPP, errno.ENOTSUP, errno.ENOTTY, errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EBADF}
+_REFLINK_MODES = ("never", "always", "auto")
+_METADATA_LEVELS = ("full", "basic", "data")
+_reflink_support: dict[tuple[int, int], bool] = {}
+
+def _clone_file(src_fd: int, dst_fd: int, src_dev: int, mode: str) -> bool:
+    """
+    Try to reflink the whole source into the destination. Return False if the filesystem does not support it.
+    """
+    
+    if mode == "never" or fcntl is None or not sys.platform.startswith("linux"):
+        return False
+    
+    if mode == "auto":
+        devices = (src_dev, os.fstat(dst_fd).st_dev)
+        if _reflink_support.get(devices) is False:
+            return False
+    
+    try:
+        fcntl.ioctl(dst_fd, _FICLONE, src_fd)
+    except OSError as e:
+        if e.errno not in _REFLINK_FALLBACK_ERRNOS:
+            raise
+        if mode == "auto":
+            _reflink_support.setdefault(devices, False)
+        return False
+    
+    if mode == "auto":
+        _reflink_support[devices] = True
+    return True
+
+# ==================== File copy ====================
+
+class _CopyOptions(NamedTuple):
+    """
+    How the data of the files is copied, see `Task.execute`.
+    """
+    
+    engine: str = "auto"
+    chunk_threshold: int = 1 << 30
+    chunk_size: int = 64 << 20
+    chunk_workers: int = 1
+    atomic: bool = False
+    metadata: str = "full"
+    chunk_executor: Executor | None = None
+
+def _copy_file_data(src: Path, dst: Path, st: _FileStat, reflink: str, options: _CopyOptions) -> str:
+    """
+    Copy the content of `src` into a new file `dst`, returning the name of the engine that copied it.
+    """
+    
+    # Opening a named pipe for reading would block until a writer shows up, like `shutil.copyfile` refuse it.
+    if not stat.S_ISREG(st.mode):
+        raise shutil.SpecialFileError(f"`{src}` is not a regular file")
+    
+    engine = options.engine
+    flags = getattr(os, "O_BINARY", 0) | getattr(os, "O_CLOEXEC", 0)
+    src_fd = os.open(src, os.O_RDONLY | flags)
+    try:
+        try:
+            dst_fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | flags, 0o666)
+        except PermissionError:
+            # An incremental copy replacing a read-only file.
+            os.unlink(dst)
+            dst_fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | flags, 0o666)
+        try:
+            # The destination was created empty, an empty file has nothing more to copy.
+            if st.size == 0:
+                return "empty"
+            
+            if _clone_file(src_fd, dst_fd, st.dev, reflink):
+                return "reflink"
+            
+            sparse = st.is_sparse and hasattr(os, "SEEK_DATA")
+            chunked = options.chunk_workers > 1 and st.size >= options.chunk_threshold
+            if not sparse and not chunked:
+                return _copy_range(src_fd, dst_fd, 0, None, engine)
+            
+            # Only the data extents of a sparse file are copied, the holes are recreated by sizing the destination.
+            ranges = list(_data_extents(src_fd, st.size)) if sparse else [(0, st.size)]
+            os.ftruncate(dst_fd, st.size)
+            if chunked:
+                engines = _copy_file_chunks(src, dst, ranges, options)
+            else:
+                engines = {_copy_range(src_fd, dst_fd, offset, count, engine) for offset, count in ranges}
+            
+            return "+".join(sorted(engines) or ["hole"]) + (" (sparse)" if sparse else "") + (" (chunked)" if chunked else "")
+        finally:
+            os.close(dst_fd)
+    finally:
+        os.close(src_fd)
+
+def _data_extents(fd: int, size: int) -> Iterator[tuple[int, int]]:
+    """
+    Yield the `(offset, count)` data extents of a file, skipping its holes.
+    """
+    
+    offset = 0
+    while offset < size:
+        try:
+            offset = os.lseek(fd, offset, os.SEEK_DATA)
+        except OSError as e:
+            if e.errno == errno.ENXIO:    # Only a hole remains.
+                return
+            raise
+        
+        end = min(os.lseek(fd, offset, os.SEEK_HOLE), size)
+        yield offset, end - offset
+        offset = end
+
+def _copy_file_chunks(src: Path, dst: Path, ranges: list[tuple[int, int]], options: _CopyOptions) -> set[str]:
+    """
+    Copy byte ranges of a large file, split in at most `chunk_size` bytes, `chunk_workers` of them at a time,
+    each through its own file descriptors with positional I/O. Return the names of the engines that copied the chunks.
+    With `chunk_executor`, the chunks are copied by that pool, shared with the other large files of the device group.
+    """
+    
+    def copy_chunk(chunk: tuple[int, int]) -> str:
+        flags = getattr(os, "O_BINARY", 0) | getattr(os, "O_CLOEXEC", 0)
+        src_fd = os.open(src, os.O_RDONLY | flags)
+        try:
+            dst_fd = os.open(dst, os.O_WRONLY | flags)
+            try:
+                return _copy_range(src_fd, dst_fd, *chunk, options.engine)
+            finally:
+                os.close(dst_fd)
+        finally:
+            os.close(src_fd)
+    
+    chunks = [
+        (start, min(options.chunk_size, offset + count - start))
+        for offset, count in ranges
+        for start in range(offset, offset + count, options.chunk_size)
+    ]
+    if not chunks:
+        return set()
+    
+    if options.chunk_executor is not None:
+        return set(options.chunk_executor.map(copy_chunk, chunks))
+    
+    with ThreadPoolExecutor(max_workers=min(options.chunk_workers, len(chunks))) as executor:
+        return set(executor.map(copy_chunk, chunks))
+
+# ==================== Devices ====================
+# The copy is scheduled per pair of source and destination devices, each pair with its own pool, so that the devices
+# of a task list are all kept busy. A spinning disk slows down under concurrent random I/O, so the pairs involving one
+# get few workers, while SSDs and NVMe drives, or devices of unknown kind (network, tmpfs, ...), get all of them.
+
+_ROTATIONAL_WORKERS = 2
+
+_rotational: dict[int, bool] = {}
+
+def _is_rotational(dev: int) -> bool:
+    """
+    Whether the block device holding `dev` is a spinning disk, read from /sys/dev/block/MAJOR:MINOR/queue/rotational,
+    or from the disk of a partition. Devices without a block device behind them are not considered rotational.
+    """
+    
+    rotational = _rotational.get(dev)
+    if rotational is None:
+        rotational = False
+        block = f"/sys/dev/block/{os.major(dev)}:{os.minor(dev)}"
+        for path in (f"{block}/queue/rotational", f"{block}/../queue/rotational"):
+            try:
+                with open(path) as f:
+                    rotational = f.read().strip() == "1"
+                break
+            except OSError:
+                continue
+        _rotational[dev] = rotational
+    return rotational
+
+def _device_of(path: Path) -> int:
+    """
+    The device of a path, or of its nearest existing ancestor.
+    """
+    
+    while True:
+        try:
+            return os.stat(path).st_dev
+        except FileNotFoundError:
+            if path.parent == path:
+                raise
+            path = path.parent
+
+def _device_workers(devices: tuple[int, int] | None, workers: int) -> int:
+    if devices is not None and any(_is_rotational(dev) for dev in devices):
+        return min(workers, _ROTATIONAL_WORKERS)
+    return workers
+
+def _format_device(dev: int) -> str:
+    kind = "HDD" if _is_rotational(dev) else "SSD/other"
+    return f"{os.major(dev)}:{os.minor(dev)} ({kind})"
+
+# Within a device group, the files can be copied in the order of their layout on the source disk instead of
+# the order of the walk, so that a spinning disk reads them with few seeks: "inode" sorts them by inode number,
+# which filesystems allocate close to the data, "extent" by the physical offset of their first extent (FIEMAP).
+
+_ORDERS = ("walk", "inode", "extent")
+_FIEMAP = 0xC020660B
+_FIEMAP_HEADER = struct.Struct("=QQIIII")               # start, length, flags, mapped extents, extent count, reserved
+_FIEMAP_EXTENT = struct.Struct("=QQQQQIIII")            # logical, physical, length, 2 reserved, flags, 3 reserved
+_FIEMAP_FALLBACK_ERRNOS = {errno.EOPNOTSUPP, errno.ENOTSUP, errno.ENOTTY, errno.EINVAL, errno.ENOSYS, errno.EBADMSG}
+
+def _first_physical_offset(path: Path) -> int | None:
+    """
+    The physical offset of the first extent of a file, 0 for a file without extents (empty, or inlined in its inode),
+    or None where FIEMAP is not supported.
+    """
+    
+    if fcntl is None or not sys.platform.startswith("linux"):
+        return None
+    
+    request = bytearray(_FIEMAP_HEADER.pack(0, 0xFFFF_FFFF_FFFF_FFFF, 0, 0, 1, 0) + bytes(_FIEMAP_EXTENT.size))
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        fcntl.ioctl(fd, _FIEMAP, request)
+    except OSError as e:
+        if e.errno not in _FIEMAP_FALLBACK_ERRNOS:
+            raise
+        return None
+    finally:
+        os.close(fd)
+    
+    if _FIEMAP_HEADER.unpack_from(request)[3] == 0:
+        return 0
+    return _FIEMAP_EXTENT.unpack_from(request, _FIEMAP_HEADER.size)[1]
+
+# ==================== Progress ====================
+# The progress of the copy is counted in bytes as well as in files, so that its rate and its time remaining
+# stay meaningful when a few huge files sit among many small ones.
+
+class _FileRateColumn(ProgressColumn):
+    """
+    The files copied so far, out of the total if known, and the average rate at which they were copied.
+    """
+    
+    def render(self, task: ProgressTask) -> Text:
+        files, total = task.fields["files"], task.fields["total_files"]
+        rate = files / task.elapsed if task.elapsed else 0
+        return Text(f"{files}/{'?' if total is None else total} files ({rate:.0f}/s)", style="progress.data.speed")
+
+class _Progress:
+    """
+    The progress bar of the copy. The workers add the files they copy to two counters under a lock, and a thread
+    renders the counters at a fixed rate, so a file only costs one locked addition, however small it is.
+    The bar, the speed and the time remaining are computed from the bytes, the files are shown next to them.
+    """
+    
+    __REFRESH_INTERVAL = 0.1
+    
+    def __init__(self, description: str, total_files: int | None, total_bytes: int | None):
+        self.files = 0
+        self.bytes = 0
+        self._lock = Lock()
+        self._done = Event()
+        self._progress = Progress(
+            TextColumn("[progress.description]{task.description}"), BarColumn(), TaskProgressColumn(),
+            DownloadColumn(), TransferSpeedColumn(), _FileRateColumn(), TimeRemainingColumn(),
+            auto_refresh=False
+        )
+        self._task = self._progress.add_task(description, total=total_bytes, files=0, total_files=total_files)
+        self._refresher = Thread(target=self._refresh_until_done, daemon=True)
+    
+    def __enter__(self) -> Self:
+        _flush_log_listener()
+        self._progress.start()
+        self._refresher.start()
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        self._done.set()
+        self._refresher.join()
+        self._refresh()
+        self._progress.stop()
+    
+    def advance(self, files: int, size: int) -> None:
+        with self._lock:
+            self.files += files
+            self.bytes += size
+    
+    def _refresh(self) -> None:
+        with self._lock:
+            files, size = self.files, self.bytes
+        self._progress.update(self._task, completed=size, files=files)
+        self._progress.refresh()
+    
+    def _refresh_until_done(self) -> None:
+        while not self._done.wait(self.__REFRESH_INTERVAL):
+            self._refresh()
+
+# ==================== Journal ====================
+
+class _Journal:
+    """
+    An append-only journal of the indexes of the completed files of a plan, so that an interrupted execution
+    can be resumed. The header holds a fingerprint of the plan, the records are little-endian uint64 indexes,
+    and the file is fsync-ed in batches of records to stay cheap.
+    
+    The records of a batch are only written once `before_sync` has made their files durable, so that after a crash
+    of the host, not only of the process, a recorded file is always complete in its destination. That is done once
+    per batch, like the fsync of the journal itself, never per file.
+    """
+    
+    __MAGIC = b"FCOPYJ1\n"
+    __RECORD = struct.Struct("<Q")
+    __SYNC_EVERY_RECORDS = 4096
+    __SYNC_EVERY_SECONDS = 1.0
+    
+    def __init__(self, path: Path, fingerprint: bytes, before_sync: Callable[[], None] | None = None):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.before_sync = before_sync
+        self._file = None
+        self._unsynced: list[int] = []
+        self._last_sync = time.monotonic()
+    
+    def load(self) -> list[int]:
+        """
+        Read the indexes already recorded, or nothing if there is no journal yet.
+        """
+        
+        try:
+            data = self.path.read_bytes()
+        except FileNotFoundError:
+            return []
+        
+        header = self.__MAGIC + self.fingerprint
+        assert data[:len(header)] == header, f"Journal {self.path} was not written for this plan."
+        
+        # A record torn by a crash is ignored, its file is copied again.
+        records = data[len(header):]
+        records = records[:len(records) - len(records) % self.__RECORD.size]
+        return [index for index, in self.__RECORD.iter_unpack(records)]
+    
+    def open(self) -> None:
+        exists = self.path.exists()
+        self._file = open(self.path, "ab")
+        if not exists:
+            self._file.write(self.__MAGIC + self.fingerprint)
+            self._sync()
+        else:
+            # Drop a torn record, so that the next ones stay aligned.
+            size = self._file.tell()
+            header_size = len(self.__MAGIC) + len(self.fingerprint)
+            self._file.truncate(size - (size - header_size) % self.__RECORD.size)
+    
+    def record(self, indexes: Iterable[int]) -> None:
+        self._unsynced.extend(indexes)
+        if len(self._unsynced) >= self.__SYNC_EVERY_RECORDS or time.monotonic() - self._last_sync >= self.__SYNC_EVERY_SECONDS:
+            self._sync()
+    
+    def close(self) -> None:
+        if self._file is not None:
+            self._sync()
+            self._file.close()
+            self._file = None
+    
+    def _sync(self) -> None:
+        if self._unsynced and self.before_sync is not None:
+            self.before_sync()
+        self._file.write(b"".join(self.__RECORD.pack(index) for index in self._unsynced))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = []
+        self._last_sync = time.monotonic()
+
+# ==================== Plan ====================
+# The directories and files to copy are stored column by column, in flat `array`s, instead of as `Path` objects,
+# so that the plan of a tree of tens of millions of files still fits in memory. Paths are built on access.
+
+class _Plan:
+    """
+    The directories and files of a plan.
+    
+    A directory is a row of the directory table: the index of its parent (-1 for the destination of a task),
+    its name, its task and its state. A file is the index of its directory, its name and its stat, spread over
+    one column per field (a size of -1 stands for a missing stat). The directories to create are listed by index
+    in `planned`, parents first. The path of a directory relative to its task is cached once built, so the paths
+    of a file only cost a join, from the base directories of its task.
+    
+    A file takes 64 bytes in the columns plus its name (a str of ~50 bytes plus its length, and its slot in the list),
+    around 140 bytes in all, instead of 700 bytes or more for two `Path` objects and a stat tuple.
+    """
+    
+    LISTED, PLANNED, EXISTING = 0, 1, 2
+    
+    def __init__(self, src_base: list[Path], dst_base: list[Path]):
+        self.src_base = src_base
+        self.dst_base = dst_base
+        
+        self.dir_parent = array("q")
+        self.dir_name: Sequence[str] = []
+        self.dir_task = array("q")
+        self.dir_state = bytearray()
+        self.planned = array("q")
+        
+        self.file_dir = array("q")
+        self.file_name: Sequence[str] = []
+        self.file_size = array("q")
+        self.file_mtime_ns = array("q")
+        self.file_atime_ns = array("q")
+        self.file_mode = array("Q")
+        self.file_ino = array("Q")
+        self.file_dev = array("Q")
+        self.file_blocks = array("q")
+        
+        self._dir_rel: list[str | None] = []
+        
+        # None for a loaded plan, until the summary computes them.
+        self.stats: _PlanStats | None = _PlanStats()
+    
+    def add_directory(self, parent: int, name: str, task: int, exists: bool = False) -> int:
+        """
+        Add a directory to the table, without planning it, and return its index.
+        """
+        
+        self.dir_parent.append(parent)
+        self.dir_name.append(name)
+        self.dir_task.append(task)
+        self.dir_state.append(self.EXISTING if exists else self.LISTED)
+        return len(self.dir_parent) - 1
+    
+    def plan_directory(self, index: int) -> None:
+        """
+        Plan a directory to be created, after those of its ancestors that are neither planned nor existing yet.
+        """
+        
+        missing: list[int] = []
+        while index >= 0 and self.dir_state[index] == self.LISTED:
+            missing.append(index)
+            index = self.dir_parent[index]
+        
+        for d in reversed(missing):
+            self.dir_state[d] = self.PLANNED
+            self.planned.append(d)
+    
+    def add_file(self, directory: int, name: str, st: _FileStat | None) -> None:
+        if st is None:
+            st = _FileStat(-1, 0, 0, 0, 0, 0, 0)
+        
+        self.file_dir.append(directory)
+        self.file_name.append(name)
+        self.file_size.append(st.size)
+        self.file_mtime_ns.append(st.mtime_ns)
+        self.file_atime_ns.append(st.atime_ns)
+        self.file_mode.append(st.mode)
+        self.file_ino.append(st.ino)
+        self.file_dev.append(st.dev)
+        self.file_blocks.append(st.blocks)
+        self.stats.add(name, st.size, st.blocks)
+    
+    @property
+    def file_columns(self) -> tuple:
+        return (self.file_dir, self.file_size, self.file_mtime_ns, self.file_atime_ns, self.file_mode, self.file_ino, self.file_dev, self.file_blocks)
+    
+    def directory_rel(self, index: int) -> str:
+        """
+        The path of a directory relative to the base directories of its task, "" for the destination of the task.
+        """
+        
+        cache = self._dir_rel
+        if len(cache) < len(self.dir_parent):
+            cache.extend([None] * (len(self.dir_parent) - len(cache)))
+        
+        chain: list[int] = []
+        while index >= 0 and cache[index] is None:
+            chain.append(index)
+            index = self.dir_parent[index]
+        
+        rel = cache[index] if index >= 0 else ""
+        for d in reversed(chain):
+            rel = cache[d] = os.path.join(rel, self.dir_name[d])
+        return rel
+    
+    def directory_src(self, index: int) -> Path:
+        return self.src_base[self.dir_task[index]] / self.directory_rel(index)
+    
+    def directory_dst(self, index: int) -> Path:
+        return self.dst_base[self.dir_task[index]] / self.directory_rel(index)
+    
+    def src_path(self, directory: int, name: str) -> Path:
+        return Path(os.path.join(self.src_base[self.dir_task[directory]], self.directory_rel(directory), name))
+    
+    def dst_path(self, directory: int, name: str) -> Path:
+        return Path(os.path.join(self.dst_base[self.dir_task[directory]], self.directory_rel(directory), name))
+    
+    def file_src(self, i: int) -> Path:
+        return self.src_path(self.file_dir[i], self.file_name[i])
+    
+    def file_dst(self, i: int) -> Path:
+        return self.dst_path(self.file_dir[i], self.file_name[i])
+    
+    def file_stat(self, i: int) -> _FileStat | None:
+        if self.file_size[i] < 0:
+            return None
+        return _FileStat(
+            self.file_size[i], self.file_mtime_ns[i], self.file_atime_ns[i], self.file_mode[i],
+            self.file_ino[i], self.file_dev[i], self.file_blocks[i]
+        )
+    
+    def file_task(self, i: int) -> int:
+        return self.dir_task[self.file_dir[i]]
+
+# The upper bounds of the file size ranges counted in the summary, plus a last range for the larger files.
+_SIZE_RANGES = (4 << 10, 64 << 10, 1 << 20, 16 << 20, 256 << 20, 4 << 30)
+
+class _PlanStats:
+    """
+    The totals of the files of a plan shown by the summary. They are updated as the files are added to the plan,
+    so that the summary does not go over the files again.
+    """
+    
+    def __init__(self):
+        self.total_size = 0
+        self.total_allocated = 0
+        self.sparse_count = 0
+        # By extension as found, the case is only folded by `top_suffixes`.
+        self.suffixes: Counter[str] = Counter()
+        self.size_ranges = [0] * (len(_SIZE_RANGES) + 1)
+    
+    def add(self, name: str, size: int, blocks: int) -> None:
+        if size < 0:
+            return
+        
+        self.total_size += size
+        self.total_allocated += blocks * 512
+        self.sparse_count += blocks * 512 < size
+        self.size_ranges[bisect_right(_SIZE_RANGES, size)] += 1
+        
+        # The extension as `os.path.splitext` finds it, ignoring the leading dots of the name.
+        dot = name.rfind(".")
+        if 0 < dot < len(name) - 1 and (name[0] != "." or name[:dot].lstrip(".")):
+            self.suffixes[name[dot:]] += 1
+    
+    def top_suffixes(self, count: int) -> list[tuple[str, int]]:
+        suffixes: Counter[str] = Counter()
+        for suffix, n in self.suffixes.items():
+            suffixes[suffix.lower()] += n
+        return suffixes.most_common(count)
+    
+    @classmethod
+    def of(cls, plan: _Plan) -> Self:
+        stats = cls()
+        for name, size, blocks in zip(plan.file_name, plan.file_size, plan.file_blocks):
+            stats.add(name, size, blocks)
+        return stats
+
+class _PlanView(Sequence):
+    """
+    A read-only sequence computing each of its items from the plan on access, so that the plan can still be read as lists.
+    """
+    
+    def __init__(self, length: Callable[[], int], item: Callable[[int], object]):
+        self._length = length
+        self._item = item
+    
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._item(j) for j in range(*i.indices(len(self)))]
+        
+        n = len(self)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError(i)
+        return self._item(i)
+    
+    def __iter__(self) -> Iterator:
+        return map(self._item, range(len(self)))
+    
+    def __len__(self) -> int:
+        return self._length()
+
+# ==================== Plan file ====================
+# A prepared plan saved to disk: a header, the tasks as JSON, then the columns of the plan as they are in memory,
+# each aligned to 8 bytes. The names are stored as an offset column followed by the UTF-8 bytes of all of them.
+# Loading maps the file in memory and views the columns in place, and a name is only decoded when it is accessed.
+# The numbers are in the native byte order, a plan is meant to be loaded on the kind of machine that saved it.
+
+_PLAN_MAGIC = b"FCOPYP2\n"
+_PLAN_HEADER = struct.Struct("<8sQQQQ")                 # magic, tasks size, directory count, planned directory count, file count
+
+class _NameColumn(Sequence[str]):
+    """
+    A read-only sequence over the names of a memory-mapped plan column, decoding each of them on access.
+    """
+    
+    def __init__(self, offsets: memoryview, data: memoryview):
+        self._offsets = offsets
+        self._data = data
+    
+    def __getitem__(self, i: int) -> str:
+        return str(self._data[self._offsets[i]:self._offsets[i + 1]], "utf-8", "surrogateescape")
+    
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+def _write_plan_columns(f, plan: _Plan) -> None:
+    def write(column) -> None:
+        size = memoryview(column).nbytes
+        f.write(column)
+        f.write(bytes(-size % 8))
+    
+    def write_names(names: Iterable[str]) -> None:
+        offsets, data = array("Q", [0]), bytearray()
+        for name in names:
+            data += name.encode("utf-8", "surrogateescape")
+            offsets.append(len(data))
+        write(offsets)
+        write(data)
+    
+    for column in (plan.dir_parent, plan.dir_task, plan.dir_state, plan.planned):
+        write(column)
+    write_names(plan.dir_name)
+    for column in plan.file_columns:
+        write(column)
+    write_names(plan.file_name)
+
+def _map_plan_columns(buffer: mmap.mmap, offset: int, plan: _Plan, directory_count: int, planned_count: int, file_count: int) -> None:
+    view = memoryview(buffer)
+    
+    def read(count: int, typecode: str) -> memoryview:
+        nonlocal offset
+        size = count * struct.calcsize(typecode)
+        column = view[offset:offset + size].cast(typecode)
+        offset += size + -size % 8
+        return column
+    
+    def read_names(count: int) -> _NameColumn:
+        offsets = read(count + 1, "Q")
+        return _NameColumn(offsets, read(offsets[-1], "B"))
+    
+    plan.dir_parent, plan.dir_task, plan.dir_state = read(directory_count, "q"), read(directory_count, "q"), read(directory_count, "B")
+    plan.planned = read(planned_count, "q")
+    plan.dir_name = read_names(directory_count)
+    (
+        plan.file_dir, plan.file_size, plan.file_mtime_ns, plan.file_atime_ns,
+        plan.file_mode, plan.file_ino, plan.file_dev, plan.file_blocks
+    ) = (read(file_count, column.typecode) for column in plan.file_columns)
+    plan.file_name = read_names(file_count)
+    plan.stats = None
+
 class Task:
     def __init__(self):
         self.task_count: int = 0
         self.src_list: list[Path] = []
         self.dst_list: list[Path] = []
+        self.src_base: list[Path] = []
         self.pat_include: list[list[str]] = []
         self.pat_exclude: list[list[str]] = []
+        self.exclude_matchers: list[_NameMatcher] = []
+        self.include_matchers: list[_IncludeMatcher | None] = []
+        self.reflink: list[str] = []
+        self.incremental: list[bool] = []
+        self.checksum: list[bool] = []
+        
+        self.plan: _Plan = _Plan(self.src_base, self.dst_list)
+        self.unchanged_count: int = 0
+        self.excluded_count: Counter[str] = Counter()
         
-        self.pre_directories: list[Path] = []
-        self.pre_file_src: list[Path] = []
-        self.pre_file_dst: list[Path] = []
+        self.journal_path: Path | None = None
+        self.journal: _Journal | None = None
+        self.finished: bytearray = bytearray()
         
-    def add(self, src_path: str, dst_path: str, pat_include: list[str] = [], pat_exclude: list[str] = []) -> Self:
+    def add(self, src_path: str, dst_path: str, pat_include: list[str] = [], pat_exclude: list[str] = [], reflink: str = "never", incremental: bool = False, checksum: bool = False) -> Self:
         """
         Add a task to copy either a file or a directory. Note that destination must be a directory.
+        
+        If `pat_include` is given, only the files matching one of its patterns are copied, and only the directories
+        leading to them are created. Patterns containing a `/` are relative to the source, e.g. `data/2024/**/*.parquet`.
+        
+        `reflink` clones the files instead of copying their data when the source and the destination are on the same
+        copy-on-write filesystem: "always" tries it for every file, "auto" probes it once per pair of devices,
+        and both fall back to a regular copy when it is not supported.
+        
+        With `incremental`, the destination may already exist: only the files that are missing from it, or that differ
+        in size or modification time (or in content, with `checksum`), are copied. An incremental task cannot be
+        journaled: running it again already resumes it.
         """
         
+        assert reflink in _REFLINK_MODES, f"Invalid reflink mode {reflink}, choose from {_REFLINK_MODES}."
+        assert not (incremental and self.journal_path is not None), "An incremental task cannot be journaled, run it again to resume it."
+        
         src, dst = Path(src_path), Path(dst_path)
         
         if not src.exists():
             log.warning(f"Source {src_path} does not exist. Skipping...")
             return self
         
-        if dst.exists():
+        if dst.exists() and not incremental and not self._resuming():
             log.warning(f"Destination {dst_path} already exists. Skipping...")
             return self
         
@@ -78,43 +1131,259 @@ class Task:
         
         self.src_list.append(src)
         self.dst_list.append(dst)
+        self.src_base.append(src.absolute())
         self.pat_include.append(pat_include)
         self.pat_exclude.append(pat_exclude)
+        self.exclude_matchers.append(_NameMatcher(self.__DEFAULT_EXCLUDE_FILE_PATTERNS + pat_exclude))
+        self.include_matchers.append(_IncludeMatcher(pat_include) if pat_include else None)
+        self.reflink.append(reflink)
+        self.incremental.append(incremental)
+        self.checksum.append(checksum)
         self.task_count += 1
         return self
         
     @_timed("Preparation")
-    def prepare(self) -> Self:
+    def prepare(self, walkers: int = 1, validate: bool = False) -> Self:
         """
         Prepare for the execution, generating all the directory/file info.
+        
+        With `walkers` > 1, the source directories are listed by that many threads at once, which hides
+        the latency of network filesystems (NFS, SMB). The resulting plan is the same as with a single walker.
+        
+        With `validate`, the checks of `validate` are done along the walk instead of after it: the tasks are checked
+        before anything is walked and every source as it is found, so a conflict fails the preparation early.
+        The totals shown by `summary` are always gathered by the walk.
         """
         
         log.info("\n==================== Preparation Phase ====================")
         
+        assert walkers >= 1, f"Invalid number of walkers {walkers}."
+        
+        if validate:
+            self._validate_tasks()
+        
+        plan = self.plan
+        for directory, name, st in self._plan_files(walkers):
+            assert st is not None or not validate, f"Pre-generated source file {plan.src_path(directory, name)} does not exist."
+            plan.add_file(directory, name, st)
+        
+        self._log_walk_counts()
+        
+        if self.journal_path is not None:
+            self._load_journal()
+        
+        if validate:
+            self._validate_plan()
+
+        return self
+
+    def _log_walk_counts(self) -> None:
+        if any(self.incremental):
+            log.info(f"[bold blue blink]Unchanged files skipped: [bold cyan blink]{self.unchanged_count}[/]", extra={"markup": True})
+        
+        for pattern, count in self.excluded_count.most_common():
+            log.info(f"[bold blue blink]Excluded by {escape(pattern)}: [bold cyan blink]{count}[/]", extra={"markup": True})
+    
+    def _plan_files(self, walkers: int = 1) -> Iterator[tuple[int, str, _FileStat | None]]:
+        """
+        Walk every task, adding its directories to the plan as they are found, and yield `(directory, name, stat)`
+        for every file to copy, with the index of its directory in the plan. A file is only yielded once its directory,
+        and all the ancestors of it, are planned.
+        """
+        
+        plan = self.plan
         for i in range(self.task_count):
-            src_root, dst, inc, exc = self.src_list[i], self.dst_list[i], self.pat_include[i], self.pat_exclude[i]
+            src_root, dst, inc, exc = self.src_list[i].absolute(), self.dst_list[i], self.include_matchers[i], self.exclude_matchers[i]
+            
+            if exc(src_root.name):
+                pattern = exc.pattern(src_root.name)
+                self.excluded_count[pattern] += 1
+                if log.isEnabledFor(logging.DEBUG):
+                    log.debug("Excluded %s (%s)", src_root, pattern)
+                continue
             
-            queue: list[Path] = [src_root]
+            root = plan.add_directory(-1, "", i, exists=self.incremental[i] and dst.is_dir())
+            
+            src_root_stat = src_root.stat()
+            if not stat.S_ISDIR(src_root_stat.st_mode) and not stat.S_ISREG(src_root_stat.st_mode):
+                log.warning(f"Source {src_root} is not a regular file. Skipping...")
+                continue
+            
+            if not stat.S_ISDIR(src_root_stat.st_mode):
+                # The relative path of a single file is its name, like in a directory task.
+                self.src_base[i] = src_root.parent
+                if inc is None or inc.match((src_root.name,)):
+                    st = _FileStat.of(src_root_stat)
+                    if self.incremental[i] and self._is_unchanged_at(src_root, st, dst / src_root.name, self.checksum[i]):
+                        self.unchanged_count += 1
+                        continue
+                    
+                    plan.plan_directory(root)
+                    yield root, src_root.name, st
+                continue
+            
+            # With include patterns, a directory is only planned once a file is included in it.
+            for directory, name, st in self._walk(i, root, src_root, exc, inc, self.incremental[i], self.checksum[i], walkers):
+                plan.plan_directory(directory)
+                yield directory, name, st
+
+    def _walk(
+        self,
+        task: int,
+        root: int,
+        src_root: Path,
+        should_exclude: _NameMatcher,
+        include: _IncludeMatcher | None,
+        incremental: bool = False,
+        checksum: bool = False,
+        walkers: int = 1
+    ) -> Iterator[tuple[int, str, _FileStat | None]]:
+        """
+        Walk the source tree of a task depth-first, from its `root` directory in the plan, adding every directory
+        that is not excluded to the plan, and yield `(directory, name, stat)` for every file that is not excluded.
+        Every directory is planned before its content, unless `include` is given: then only the included files
+        are yielded, and the directories that cannot contain one are not listed at all.
+        
+        With `incremental`, the existing destination directories are added to the plan as existing, and the files
+        that are unchanged in the destination are counted in `unchanged_count` instead of being yielded.
+        The excluded entries are counted by pattern in `excluded_count`, and only logged one by one at DEBUG level.
+        
+        With `walkers` > 1, the directories are listed by a pool of threads, so that the round trips of a network
+        filesystem overlap: the listings of the `walkers * 4` directories at the top of the queue, the next ones
+        to be walked, are always requested, so at most that many listings per level of the tree are held in memory.
+        The listings are still consumed in the order of the serial walk, so the plan is exactly the same.
+        """
+        
+        plan = self.plan
+        window = walkers * self.__WALK_PREFETCH_PER_WORKER
+        
+        def listing(src_dir: str, directory: int, rel_dir: tuple[str, ...]) -> Iterator[tuple[int, str, object]]:
+            dst_dir = plan.directory_dst(directory) if incremental and plan.dir_state[directory] == _Plan.EXISTING else None
+            return self._list_directory(src_dir, dst_dir, rel_dir, should_exclude, include, checksum)
+        
+        with ThreadPoolExecutor(max_workers=walkers) if walkers > 1 else nullcontext() as executor:
+            queue: list[tuple[str, int, tuple[str, ...], Future | None]] = [(str(src_root), root, (), None)]
             while queue:
-                src = queue.pop().absolute()
+                src_dir, directory, rel_dir, future = queue.pop()
+                if include is None:
+                    plan.plan_directory(directory)
                 
-                if self._should_exclude(src, exc):
-                    log.info(f"Excluded {src}")
+                if future is None:
+                    entries = listing(src_dir, directory, rel_dir)
+                else:
+                    entries = future.result()
+                
+                for kind, name, value in entries:
+                    if kind == self.__FILE:
+                        yield directory, name, value
+                    elif kind == self.__DIRECTORY:
+                        queue.append((os.path.join(src_dir, name), plan.add_directory(directory, name, task, exists=value), rel_dir + (name,), None))
+                    elif kind == self.__UNCHANGED:
+                        self.unchanged_count += 1
+                    else:
+                        self.excluded_count[value] += 1
+                        if log.isEnabledFor(logging.DEBUG):
+                            log.debug("Excluded %s (%s)", os.path.join(src_dir, name), value)
+                
+                if executor is None:
                     continue
                 
-                if src.is_dir():
-                    queue += list(src.iterdir())
-                    self._add_pre_dir(dst / src.relative_to(src_root))
+                for k in range(len(queue) - 1, max(len(queue) - window, 0) - 1, -1):
+                    pending = queue[k]
+                    if pending[3] is None:
+                        # The plan is only read here, the worker runs the listing to the end and keeps names and stats.
+                        queue[k] = (*pending[:3], executor.submit(list, listing(*pending[:3])))
+
+    __DIRECTORY, __FILE, __UNCHANGED, __EXCLUDED = range(4)
+    __WALK_PREFETCH_PER_WORKER = 4
+    @staticmethod
+    def _list_directory(
+        src_dir: str,
+        dst_dir: Path | None,
+        rel_dir: tuple[str, ...],
+        should_exclude: _NameMatcher,
+        include: _IncludeMatcher | None,
+        checksum: bool
+    ) -> Iterator[tuple[int, str, object]]:
+        """
+        List one source directory for `_walk`, yielding `(kind, name, value)` for each entry in listing order:
+        a subdirectory to walk with whether it exists in the destination, a file to copy with its stat,
+        a file that is unchanged in `dst_dir`, the existing destination directory of an incremental task,
+        or an excluded entry with the pattern that excludes it.
+        It does all the I/O of the walk but never touches the plan, so that it can run in a worker thread.
+        
+        The file type comes from the `d_type` reported by `os.scandir`, so directories are never stat-ed
+        (symlinks are followed like `Path.is_dir` does), and the entries are consumed as they are listed
+        instead of being copied first. Each file is stat-ed exactly once, and that stat is reused by every
+        later phase; it is None if the file vanished or is a broken symlink. The destination directory
+        is listed once, alongside its source directory.
+        """
+        
+        existing: dict[str, os.DirEntry] = {}
+        if dst_dir is not None:
+            with os.scandir(dst_dir) as dst_entries:
+                existing = {e.name: e for e in dst_entries}
+        
+        with os.scandir(src_dir) as entries:
+            for entry in entries:
+                if should_exclude(entry.name):
+                    yield Task.__EXCLUDED, entry.name, should_exclude.pattern(entry.name)
                     continue
                 
-                # src is a file
-                pre_dir = dst / src.relative_to(src_root).parent
-                pre_dst = pre_dir / src.name                
-                self._add_pre_dir(pre_dir)
-                self._add_pre_file(src, pre_dst)
-                continue
+                dst_entry = existing.get(entry.name)
+                
+                if entry.is_dir():
+                    if include is not None and not include.may_contain(rel_dir + (entry.name,)):
+                        continue
+                    
+                    if dst_entry is not None and not dst_entry.is_dir():
+                        log.warning(f"Destination {dst_entry.path} is not a directory. Skipping...")
+                        continue
+                    
+                    yield Task.__DIRECTORY, entry.name, dst_entry is not None
+                    continue
+                
+                if include is not None and not include.match(rel_dir + (entry.name,)):
+                    continue
+                
+                try:
+                    st = _FileStat.of(entry.stat())
+                except FileNotFoundError:
+                    st = None
+                
+                if st is not None and not stat.S_ISREG(st.mode):
+                    log.warning(f"Source {entry.path} is not a regular file. Skipping...")
+                    continue
+                
+                if dst_entry is not None:
+                    if dst_entry.is_dir():
+                        log.warning(f"Destination {dst_entry.path} is a directory. Skipping...")
+                        continue
+                    
+                    if st is not None and Task._is_unchanged(entry.path, st, dst_entry.path, dst_entry.stat(), checksum):
+                        yield Task.__UNCHANGED, entry.name, None
+                        continue
+                
+                yield Task.__FILE, entry.name, st
 
-        return self
+    @staticmethod
+    def _is_unchanged(src: str | Path, st: _FileStat, dst: str | Path, dst_stat: os.stat_result, checksum: bool) -> bool:
+        if st.size != dst_stat.st_size:
+            return False
+        
+        if not checksum:
+            return st.mtime_ns == dst_stat.st_mtime_ns
+        
+        with open(src, "rb") as f_src, open(dst, "rb") as f_dst:
+            return hashlib.file_digest(f_src, "blake2b").digest() == hashlib.file_digest(f_dst, "blake2b").digest()
+    
+    @staticmethod
+    def _is_unchanged_at(src: Path, st: _FileStat, dst: Path, checksum: bool) -> bool:
+        try:
+            dst_stat = dst.stat()
+        except FileNotFoundError:
+            return False
+        return stat.S_ISREG(dst_stat.st_mode) and Task._is_unchanged(src, st, dst, dst_stat, checksum)
 
     __DEFAULT_EXCLUDE_FILE_PATTERNS = [
         "~*",
@@ -124,21 +1393,139 @@ class Task:
         ".git",
         "__pycache__"
     ]
-    def _should_exclude(self, path: Path, pat_exclude: list[str]) -> bool:
-        return (
-            any(fnmatch(path.name, pattern) for pattern in self.__DEFAULT_EXCLUDE_FILE_PATTERNS)
-            or
-            any(fnmatch(path.name, pattern) for pattern in pat_exclude)
-        )
+    @property
+    def pre_directories(self) -> Sequence[Path]:
+        plan = self.plan
+        return _PlanView(lambda: len(plan.planned), lambda i: plan.directory_dst(plan.planned[i]))
+    
+    @property
+    def pre_directory_task(self) -> Sequence[int]:
+        plan = self.plan
+        return _PlanView(lambda: len(plan.planned), lambda i: plan.dir_task[plan.planned[i]])
     
-    def _add_pre_dir(self, pre_dir: Path) -> None:
-        if pre_dir not in self.pre_directories:
-            self.pre_directories.append(pre_dir)
+    @property
+    def pre_file_src(self) -> Sequence[Path]:
+        plan = self.plan
+        return _PlanView(lambda: len(plan.file_dir), plan.file_src)
     
-    def _add_pre_file(self, pre_file_src: Path, pre_file_dst: Path) -> None:
-        self.pre_file_src.append(pre_file_src)
-        self.pre_file_dst.append(pre_file_dst)
+    @property
+    def pre_file_dst(self) -> Sequence[Path]:
+        plan = self.plan
+        return _PlanView(lambda: len(plan.file_dir), plan.file_dst)
+    
+    @property
+    def pre_file_stat(self) -> Sequence[_FileStat | None]:
+        plan = self.plan
+        return _PlanView(lambda: len(plan.file_dir), plan.file_stat)
+    
+    @property
+    def pre_file_task(self) -> Sequence[int]:
+        plan = self.plan
+        return _PlanView(lambda: len(plan.file_dir), plan.file_task)
+    
+    def save_plan(self, plan_path: str) -> Self:
+        """
+        Save the prepared plan to a compact binary file, so that it can be executed by another run with `load_plan`.
+        """
+        
+        plan = self.plan
+        tasks = json.dumps([
+            {
+                "src": str(self.src_list[i]),
+                "dst": str(self.dst_list[i]),
+                "src_base": str(self.src_base[i]),
+                "reflink": self.reflink[i],
+                "incremental": self.incremental[i],
+                "checksum": self.checksum[i],
+            }
+            for i in range(self.task_count)
+        ]).encode("utf-8", "surrogateescape")
+        
+        with open(plan_path, "wb") as f:
+            f.write(_PLAN_HEADER.pack(_PLAN_MAGIC, len(tasks), len(plan.dir_parent), len(plan.planned), len(plan.file_dir)))
+            f.write(tasks)
+            f.write(bytes(-len(tasks) % 8))
+            _write_plan_columns(f, plan)
+        
+        log.info(f"[bold blue blink]Plan saved to [bold cyan blink]{plan_path}[/]", extra={"markup": True})
+        return self
+    
+    def load_plan(self, plan_path: str) -> Self:
+        """
+        Load a plan saved by `save_plan`, instead of adding tasks and preparing them. The file is memory-mapped,
+        so even a huge plan opens instantly, and the paths of an entry are only built when it is accessed.
+        """
+        
+        assert self.task_count == 0, "A plan can only be loaded into an empty task."
         
+        with open(plan_path, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        
+        magic, tasks_size, directory_count, planned_count, file_count = _PLAN_HEADER.unpack_from(buffer, 0)
+        assert magic == _PLAN_MAGIC, f"{plan_path} is not a plan file."
+        
+        offset = _PLAN_HEADER.size
+        tasks = json.loads(bytes(buffer[offset:offset + tasks_size]).decode("utf-8", "surrogateescape"))
+        offset += tasks_size + -tasks_size % 8
+        
+        for task in tasks:
+            self.src_list.append(Path(task["src"]))
+            self.dst_list.append(Path(task["dst"]))
+            self.src_base.append(Path(task["src_base"]))
+            self.pat_include.append([])
+            self.pat_exclude.append([])
+            self.exclude_matchers.append(_NameMatcher(self.__DEFAULT_EXCLUDE_FILE_PATTERNS))
+            self.include_matchers.append(None)
+            self.reflink.append(task["reflink"])
+            self.incremental.append(task["incremental"])
+            self.checksum.append(task["checksum"])
+        self.task_count = len(tasks)
+        
+        _map_plan_columns(buffer, offset, self.plan, directory_count, planned_count, file_count)
+        
+        log.info(f"[bold blue blink]Plan loaded from [bold cyan blink]{plan_path}[/]: {planned_count} directories, {file_count} files", extra={"markup": True})
+        
+        if self.journal_path is not None:
+            self._load_journal()
+        
+        return self
+    
+    def use_journal(self, journal_path: str) -> Self:
+        """
+        Record the completed files in an on-disk journal while executing. If the journal already exists,
+        from an interrupted execution of the same tasks, the files it lists are not copied again, and the
+        destinations written by that execution are accepted. Call it first, before `add`. The journal is deleted
+        once the execution is finished. It cannot be combined with incremental tasks, whose plan leaves out
+        the files an interrupted execution finished, so the journal would not match it.
+        
+        With a journal, every file is written under a temporary name and renamed once complete,
+        so that a partially written file is never mistaken for a finished one. The files are recorded in batches,
+        each written back to disk first, so the journal also holds after a crash of the host.
+        """
+        
+        assert self.task_count == 0, "The journal must be set before adding tasks."
+        
+        self.journal_path = Path(journal_path)
+        return self
+    
+    def _resuming(self) -> bool:
+        return self.journal_path is not None and self.journal_path.exists()
+    
+    def _load_journal(self) -> None:
+        fingerprint = hashlib.blake2b(digest_size=32)
+        for dst, st in zip(self.pre_file_dst, self.pre_file_stat):
+            fingerprint.update(f"{dst}\0{st.size if st is not None else -1}\0".encode("utf-8", "surrogateescape"))
+        
+        # The files of a batch, and their renames, are written back with one sync() before the batch is recorded.
+        # Without it (Windows), the journal only holds after the death of the process, not of the host.
+        self.journal = _Journal(self.journal_path, fingerprint.digest(), getattr(os, "sync", None))
+        self.finished = bytearray(len(self.pre_file_src))
+        for index in self.journal.load():
+            self.finished[index] = 1
+        
+        if self._resuming():
+            log.info(f"[bold blue blink]Resuming: [bold cyan blink]{sum(self.finished)}[/] of {len(self.finished)} files already copied", extra={"markup": True})
+    
     @_timed("Validation")
     def validate(self) -> Self:
         """
@@ -147,30 +1534,74 @@ class Task:
         
         log.info("\n==================== Validation Phase ====================")
         
+        self._validate_tasks()
+        self._validate_plan()
+        return self
+    
+    def _validate_tasks(self) -> None:
         assert self.task_count > 0, "No tasks to execute."
         
-        for i in range(self.task_count):
-            src, dst = self.src_list[i], self.dst_list[i]
-            for j in range(i + 1, self.task_count):
-                assert src != self.src_list[j], f"Duplicate source {src}"
-                assert dst != self.dst_list[j], f"Duplicate destination {dst}"
-                
-                assert not src.is_relative_to(self.src_list[j]), f"Source {self.src_list[j]} is the parent of {src}"
-                assert not self.src_list[j].is_relative_to(src), f"Source {src} is the parent of {self.src_list[j]}"
+        # No source may be inside another one, and no destination inside another one.
+        for kind, paths in (("Source", self.src_list), ("Destination", self.dst_list)):
+            pair = _nested_pair([p.absolute() for p in paths])
+            if pair is not None:
+                parent, child = paths[pair[0]], paths[pair[1]]
+                assert parent.absolute() != child.absolute(), f"Duplicate {kind.lower()} {child}"
+                assert False, f"{kind} {parent} is the parent of {child}"
+    
+    def _validate_plan(self) -> None:
+        # When resuming, the destinations may have been written by the interrupted execution of the same plan.
+        resuming = self._resuming()
         
-        for d in self.pre_directories:
-            assert d.is_absolute(), f"Pre-generated destination directory {d} is not absolute."
-            assert not d.exists(), f"Pre-generated destination directory {d} already exists."
+        # Everything is checked from the plan, the paths are only built for the error messages. Every path of a task
+        # is under its base directories, so they are absolute if those are.
+        plan = self.plan
+        for task in {plan.dir_task[d] for d in chain(plan.planned, set(plan.file_dir))}:
+            assert self.src_base[task].is_absolute(), f"Pre-generated sources of {self.src_base[task]} are not absolute."
+            assert self.dst_list[task].is_absolute(), f"Pre-generated destinations of {self.dst_list[task]} are not absolute."
         
-        for f in self.pre_file_src:
-            assert f.is_absolute(), f"Pre-generated source file {f} is not absolute."
-            assert f.exists(), f"Pre-generated source file {f} does not exist."
+        # The existence of the sources was established by the walk, which stat-ed each of them.
+        if min(plan.file_size, default=0) < 0:
+            i = next(i for i, size in enumerate(plan.file_size) if size < 0)
+            assert False, f"Pre-generated source file {plan.file_src(i)} does not exist."
         
-        for f in self.pre_file_dst:
-            assert f.is_absolute(), f"Pre-generated destination file {f} is not absolute."
-            assert not f.exists(), f"Pre-generated destination file {d} already exists."
-            
-        return self
+        if not resuming:
+            self._validate_destinations()
+    
+    def _validate_destinations(self) -> None:
+        """
+        Check that no planned destination exists yet, without stat-ing each of them: each destination directory
+        that existed before the walk is listed once, and its entries are checked by set membership. A planned
+        directory is checked in the listing of its parent, or stat-ed if it is the destination of a task, and once
+        it is known not to exist, neither can anything planned inside it.
+        """
+        
+        plan = self.plan
+        listings: dict[int, set[str]] = {}
+        def listing(d: int) -> set[str]:
+            names = listings.get(d)
+            if names is None:
+                try:
+                    names = listings[d] = set(os.listdir(plan.directory_dst(d)))
+                except FileNotFoundError:
+                    names = listings[d] = set()
+            return names
+        
+        for d in plan.planned:
+            parent = plan.dir_parent[d]
+            if parent < 0:
+                exists = os.path.lexists(plan.directory_dst(d))
+            elif plan.dir_state[parent] != _Plan.PLANNED:
+                exists = plan.dir_name[d] in listing(parent)
+            else:
+                continue
+            assert not exists, f"Pre-generated destination directory {plan.directory_dst(d)} already exists."
+        
+        # The destination files of an incremental task are allowed to exist, they are the ones to update.
+        existing = {d for d in set(plan.file_dir) if plan.dir_state[d] != _Plan.PLANNED and not self.incremental[plan.dir_task[d]]}
+        for i, d in enumerate(plan.file_dir):
+            if d in existing:
+                assert plan.file_name[i] not in listing(d), f"Pre-generated destination file {plan.file_dst(i)} already exists."
     
     @_timed("Summary")
     def summary(self) -> Self:
@@ -182,27 +1613,38 @@ class Task:
         
         log.info("-" * 40)
         
-        log.info(f"[bold blue blink]Total directories: [bold cyan blink]{len(self.pre_directories)}[/]", extra={"markup": True})
+        plan, stats = self.plan, self._plan_stats()
+        
+        log.info(f"[bold blue blink]Total directories: [bold cyan blink]{len(plan.planned)}[/]", extra={"markup": True})
         # for item in self.pre_directories:
         #     log.info(f"{item}")
                     
         log.info("-" * 40)
         
-        log.info(f"[bold blue blink]Total files to copy: [bold cyan blink]{len(self.pre_file_src)}[/]", extra={"markup": True})
+        log.info(f"[bold blue blink]Total files to copy: [bold cyan blink]{len(plan.file_dir)}[/]", extra={"markup": True})
         # for i in range(len(self.pre_file_src)):
         #     log.info(f"{self.pre_file_src[i]} -> {self.pre_file_dst[i]}")
         
         log.info("-" * 40)
         
-        total_size = sum(f.stat().st_size for f in self.pre_file_src)
-        total_size_gb = total_size / (1024 ** 3)
+        total_size_gb = stats.total_size / (1024 ** 3)
         log.info(f"[bold blue blink]Total file size: [bold cyan blink]{total_size_gb:.2f} GB[/]", extra={"markup": True})
         
+        total_allocated_gb = stats.total_allocated / (1024 ** 3)
+        log.info(f"[bold blue blink]Total allocated size: [bold cyan blink]{total_allocated_gb:.2f} GB[/] ({stats.sparse_count} sparse files)", extra={"markup": True})
+        
         log.info("-" * 40)
         
-        suffixes = [f.suffix.lower() for f in self.pre_file_src if f.suffix]
-        top_suffixes = Counter(suffixes).most_common(10)
-        max_suffix_length = max(len(suffix) for suffix, _ in top_suffixes)
+        log.info("[bold blue blink]File sizes:[/]", extra={"markup": True})
+        bounds = [0, *_SIZE_RANGES]
+        for i, count in enumerate(stats.size_ranges):
+            label = f"< {_format_size(bounds[i + 1])}" if i < len(_SIZE_RANGES) else f">= {_format_size(bounds[i])}"
+            log.info(f"[bold purple blink]{label:<9}[/] : {count}", extra={"markup": True})
+        
+        log.info("-" * 40)
+        
+        top_suffixes = stats.top_suffixes(10)
+        max_suffix_length = max((len(suffix) for suffix, _ in top_suffixes), default=0)
         
         log.info(f"[bold blue blink]Top 10 file extensions:[/]", extra={"markup": True})
         for suffix, count in top_suffixes:
@@ -210,19 +1652,471 @@ class Task:
         
         return self
     
+    def _plan_stats(self) -> _PlanStats:
+        # The totals are gathered as the files are added to the plan. Only a loaded plan has to compute them, once.
+        if self.plan.stats is None:
+            self.plan.stats = _PlanStats.of(self.plan)
+        return self.plan.stats
+    
     @_timed("Execution")
-    def execute(self) -> None:
+    def execute(
+        self,
+        workers: int = 1,
+        use_processes: bool = False,
+        streaming: bool = False,
+        engine: str = "auto",
+        chunk_threshold: int = 1 << 30,
+        chunk_size: int = 64 << 20,
+        chunk_workers: int | None = None,
+        walkers: int = 1,
+        order: str = "walk",
+        metadata: str = "full",
+        metadata_workers: int | None = None
+    ) -> None:
+        """
+        Create the directories and copy the files. With `workers` > 1 the files are copied by a pool
+        of threads, or of processes if `use_processes` is set.
+        
+        The files are grouped by source and destination device, and each group gets its own pool of `workers`,
+        so that the copies to and from different disks run at the same time. A group involving a spinning disk
+        (see /sys/block/*/queue/rotational) only gets 2 workers, to spare it from random I/O.
+        
+        `order` sets the order in which the files of a group are copied: "walk" keeps the order of the plan,
+        "inode" sorts them by inode number and "extent" by the physical offset of their first extent (FIEMAP,
+        or by inode number where it is not supported), so that the reads of a spinning disk are close to sequential.
+        
+        The data is copied in the kernel with `copy_file_range`, or `sendfile` if that is not supported
+        for a file, and through a user-space buffer as a last resort. `engine` forces one of them
+        ("copy_file_range", "sendfile" or "buffered"); the number of files handled by each engine is reported.
+        Empty files are only created, their data is not read.
+        
+        Only the data extents of sparse files are copied, their holes are preserved.
+        Files of at least `chunk_threshold` bytes are split into `chunk_size` byte ranges copied by `chunk_workers`
+        threads at once (`workers` by default), so that a single huge file is not limited to one stream;
+        its metadata is applied once all of its chunks are copied. The large files of a device group share
+        its chunk threads, limited like the workers for a spinning disk, and with processes they are split
+        between the processes of the group.
+        
+        `metadata` is the fidelity of the copy: "full" restores the times, the permissions and the extended attributes
+        of the files and directories, "basic" only the times and the permissions, and "data" none of them.
+        The metadata of the files is applied in its own phase, once all the data is copied, by `metadata_workers`
+        threads (`workers` by default), from the stat captured by the walk. It is only applied right after the data
+        of each file with a journal, where a file must be complete once recorded, and while streaming.
+        The directories are restored last, bottom-up, since creating their content changes their times.
+        
+        With `streaming`, `prepare` must not have been called: the sources are walked while the files
+        are being copied, through a bounded queue, so the copy starts right away and the memory used
+        does not grow with the number of files. Only the directories are kept, and each of them is created
+        before any file in it is copied. Files that vanish during the walk are skipped with a warning.
+        Streaming cannot be combined with a journal (see `use_journal`). `walkers` is passed to the walk, like in `prepare`.
+        """
+        
         log.info("\n==================== Execution Phase ====================")
         
-        for i in track(range(len(self.pre_directories)), description="Creating directories..."):
-            pre_dir = self.pre_directories[i]
-            pre_dir.mkdir(parents=True, exist_ok=True)
+        assert workers >= 1, f"Invalid number of workers {workers}."
+        assert chunk_size > 0, f"Invalid chunk size {chunk_size}."
+        assert order in _ORDERS, f"Invalid order {order}, choose from {_ORDERS}."
+        assert metadata in _METADATA_LEVELS, f"Invalid metadata level {metadata}, choose from {_METADATA_LEVELS}."
+        
+        deferred = not streaming and self.journal_path is None
+        options = _CopyOptions(
+            engine, chunk_threshold, chunk_size, workers if chunk_workers is None else chunk_workers,
+            self.journal_path is not None, "data" if deferred else metadata
+        )
+        
+        if streaming:
+            assert not self.pre_file_src and not self.pre_directories, "Streaming execution walks the sources itself, do not call prepare() before."
+            assert self.journal_path is None, "Streaming execution cannot be journaled."
+            assert order == "walk", "Streaming execution copies the files in the order of the walk."
+            # The devices of the files are not known ahead, they all go through one pool.
+            written: set[int] = set()
+            self._copy_files_with_progress({None: self._stream_plan(walkers, written)}, None, None, workers, use_processes, options)
+            self._log_walk_counts()
+            self._apply_metadata([], metadata, 1, written)
+            return
+        
+        if self.journal is None:
+            self._create_directories(workers)
+            indexes = range(len(self.pre_file_src))
+            total_bytes = self._plan_stats().total_size
+            self._copy_files_with_progress(self._device_groups(indexes, order), len(indexes), total_bytes, workers, use_processes, options)
+            self._apply_metadata(indexes, metadata, workers if metadata_workers is None else metadata_workers)
+            return
+        
+        # The journal is on disk before any destination is created, so that an execution killed at any point,
+        # even while creating the directories, is resumed instead of finding its own destinations in the way.
+        remaining = [i for i in range(len(self.pre_file_src)) if not self.finished[i]]
+        total_bytes = sum(max(self.plan.file_size[i], 0) for i in remaining)
+        self.journal.open()
+        try:
+            self._create_directories(workers)
+            self._copy_files_with_progress(self._device_groups(remaining, order), len(remaining), total_bytes, workers, use_processes, options)
+        finally:
+            self.journal.close()
+        self._apply_metadata([], metadata, 1)
+        
+        # Only an interrupted execution is resumed: once finished, the same tasks are checked like new ones.
+        self.journal_path.unlink()
+    
+    def _create_directories(self, workers: int) -> None:
+        """
+        Create the planned directories with exactly one mkdir each. The children of a directory are created relative
+        to it (mkdirat), opening it once for all of them, and as soon as a directory exists its own children can be
+        created, so independent subtrees are created in parallel by `workers` threads. The destination of a task is
+        created with its missing ancestors.
+        """
+        
+        plan = self.plan
+        roots: list[int] = []
+        children: dict[int, list[int]] = {}
+        for d in plan.planned:
+            parent = plan.dir_parent[d]
+            if parent < 0:
+                roots.append(d)
+            else:
+                children.setdefault(parent, []).append(d)
+        
+        def created() -> Iterator[None]:
+            for d in roots:
+                os.makedirs(plan.directory_dst(d), exist_ok=True)
+                yield None
+            
+            done: SimpleQueue[tuple[list[int], Future]] = SimpleQueue()
+            in_flight = 0
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                def submit(parent: int) -> None:
+                    nonlocal in_flight
+                    parent_dir = str(plan.directory_dst(parent))
+                    for batch in _batched(children[parent], self.__COPY_BATCH_SIZE):
+                        future = executor.submit(self._make_directories, parent_dir, [plan.dir_name[d] for d in batch])
+                        future.add_done_callback(lambda future, batch=batch: done.put((batch, future)))
+                        in_flight += 1
+                
+                # The planned directories whose parent already exists: under a task destination, or under an existing directory.
+                for parent in children:
+                    if plan.dir_state[parent] == _Plan.EXISTING or plan.dir_parent[parent] < 0:
+                        submit(parent)
+                
+                while in_flight:
+                    batch, future = done.get()
+                    in_flight -= 1
+                    future.result()
+                    for d in batch:
+                        if d in children:
+                            submit(d)
+                        yield None
+        
+        _flush_log_listener()
+        for _ in track(created(), total=len(plan.planned), description="Creating directories..."):
+            pass
+    
+    @staticmethod
+    def _make_directories(parent: str, names: list[str]) -> None:
+        """
+        Create directories in an existing parent. A directory that already exists, left by an interrupted
+        execution (see `use_journal`), is accepted.
+        """
+        
+        dir_fd = os.open(parent, os.O_RDONLY | getattr(os, "O_DIRECTORY", 0)) if os.mkdir in os.supports_dir_fd else None
+        try:
+            for name in names:
+                path = name if dir_fd is not None else os.path.join(parent, name)
+                try:
+                    os.mkdir(path, dir_fd=dir_fd)
+                except FileExistsError:
+                    if not stat.S_ISDIR(os.stat(path, dir_fd=dir_fd).st_mode):
+                        raise
+        finally:
+            if dir_fd is not None:
+                os.close(dir_fd)
+    
+    def _device_groups(self, indexes: Iterable[int], order: str = "walk") -> dict[tuple[int, int], Iterator[tuple[int, Path, Path, _FileStat, str]]]:
+        """
+        Group the files to copy by their `(source device, destination device)` pair, each group in the given `order`.
+        """
+        
+        plan = self.plan
+        dst_devices = [_device_of(dst) for dst in self.dst_list]
+        groups: dict[tuple[int, int], array] = {}
+        for i in indexes:
+            groups.setdefault((plan.file_dev[i], dst_devices[plan.file_task(i)]), array("q")).append(i)
+        
+        if order != "walk":
+            groups = {devices: self._layout_order(group, order) for devices, group in groups.items()}
+        
+        return {devices: self._planned_files(group) for devices, group in groups.items()}
+    
+    def _layout_order(self, group: array, order: str) -> array:
+        """
+        Sort the files of a group by their physical layout on the source device. Files at the same position
+        (no extents, or the same inode) keep the order of the walk.
+        """
+        
+        plan = self.plan
+        if order == "extent":
+            offsets = array("Q")
+            for i in group:
+                offset = _first_physical_offset(plan.file_src(i))
+                if offset is None:
+                    log.warning(f"FIEMAP is not supported for {plan.file_src(i)}, ordering by inode instead.")
+                    break
+                offsets.append(offset)
+            else:
+                return array("q", (group[k] for k in sorted(range(len(group)), key=offsets.__getitem__)))
+        
+        return array("q", sorted(group, key=plan.file_ino.__getitem__))
+    
+    def _planned_files(self, indexes: Iterable[int]) -> Iterator[tuple[int, Path, Path, _FileStat, str]]:
+        plan = self.plan
+        for i in indexes:
+            yield i, plan.file_src(i), plan.file_dst(i), plan.file_stat(i), self.reflink[plan.file_task(i)]
+    
+    def _stream_plan(self, walkers: int, written: set[int]) -> Iterator[tuple[int, Path, Path, _FileStat, str]]:
+        """
+        Walk the sources and yield the files to copy, creating their directories first. The files are not kept,
+        only their directories are added to `written`.
+        """
+        
+        plan = self.plan
+        created = 0
+        for i, (directory, name, st) in enumerate(self._plan_files(walkers)):
+            # The directories planned so far, ancestors first, now include the one of this file.
+            while created < len(plan.planned):
+                plan.directory_dst(plan.planned[created]).mkdir(parents=True, exist_ok=True)
+                created += 1
+            
+            src = plan.src_path(directory, name)
+            if st is None:
+                log.warning(f"Source {src} vanished. Skipping...")
+                continue
+            
+            written.add(directory)
+            yield i, src, plan.dst_path(directory, name), st, self.reflink[plan.dir_task[directory]]
+        
+        for d in plan.planned[created:]:
+            plan.directory_dst(d).mkdir(parents=True, exist_ok=True)
+    
+    def _copy_files_with_progress(
+        self,
+        groups: dict[tuple[int, int] | None, Iterable[tuple[int, Path, Path, _FileStat, str]]],
+        total_files: int | None,
+        total_bytes: int | None,
+        workers: int,
+        use_processes: bool,
+        options: _CopyOptions
+    ) -> None:
+        engines: Counter[str] = Counter()
         
-        for i in track(range(len(self.pre_file_src)), description="Copying files..."):
-            self._copy_file_with_metadata(self.pre_file_src[i], self.pre_file_dst[i])
+        description = "Copying files..." if workers == 1 else f"Copying files ({workers} workers)..."
+        with _Progress(description, total_files, total_bytes) as progress:
+            # Threads count each file as soon as it is copied, while processes cannot share the counters:
+            # their files are counted by batch, as the batches complete.
+            shared = progress if workers == 1 or not use_processes else None
+            
+            def complete(results: Iterable[list[tuple[int, str, int]]]) -> None:
+                for batch in results:
+                    engines.update(name for _, name, _ in batch)
+                    if self.journal is not None:
+                        self.journal.record(index for index, _, _ in batch)
+                    if shared is None:
+                        progress.advance(len(batch), sum(size for _, _, size in batch))
+            
+            # The chunks of the large files of a group are copied by one pool of `chunk_workers` threads (or fewer
+            # for a spinning disk), instead of one pool per file, so that the group never has more streams than that.
+            # A worker process cannot share it: each process of the group gets its share of the threads.
+            def group_options(stack: ExitStack, devices: tuple[int, int] | None, group_workers: int) -> _CopyOptions:
+                chunk_workers = _device_workers(devices, options.chunk_workers)
+                if use_processes and workers > 1:
+                    return options._replace(chunk_workers=max(1, chunk_workers // group_workers))
+                if chunk_workers == 1:
+                    return options._replace(chunk_workers=1)
+                chunk_executor = stack.enter_context(ThreadPoolExecutor(max_workers=chunk_workers))
+                return options._replace(chunk_workers=chunk_workers, chunk_executor=chunk_executor)
+            
+            with ExitStack() as stack:
+                if workers == 1:
+                    for devices, files in groups.items():
+                        group = group_options(stack, devices, 1)
+                        complete(self._copy_files([file], group, shared) for file in files)
+                else:
+                    # Files are handed out in batches so that the per-file cost of the pool stays negligible
+                    # next to the copy itself, which matters most for trees of many small files. At most
+                    # `window` batches are in flight per group, which is what bounds the memory of a streaming execution.
+                    pool_type = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+                    queues = {}
+                    for devices, files in groups.items():
+                        group_workers = _device_workers(devices, workers)
+                        if devices is not None:
+                            log.info(f"[bold blue blink]Device {_format_device(devices[0])} -> {_format_device(devices[1])}: [bold cyan blink]{group_workers}[/] workers", extra={"markup": True})
+                        
+                        # Entered after the chunk pool of the group, so it is shut down before it.
+                        group = group_options(stack, devices, group_workers)
+                        executor = stack.enter_context(pool_type(max_workers=group_workers))
+                        batches = _batched(files, self.__COPY_BATCH_SIZE)
+                        queues[devices] = (executor, group_workers * 4, ((batch, group, shared) for batch in batches))
+                    
+                    complete(_imap_scheduled(self._copy_files, queues))
+        
+        for name, count in engines.most_common():
+            log.info(f"[bold blue blink]Copied with {name}: [bold cyan blink]{count}[/] files", extra={"markup": True})
 
-    def _copy_file_with_metadata(self, src: Path, dst: Path) -> None:
-        shutil.copy2(src, dst)
+    __COPY_BATCH_SIZE = 64
+    @staticmethod
+    def _copy_files(files: list[tuple[int, Path, Path, _FileStat, str]], options: _CopyOptions, progress: _Progress | None = None) -> list[tuple[int, str, int]]:
+        """
+        Copy a batch of files, returning the index of each of them with the name of the engine that copied it and
+        its size. With `progress`, each file is counted in it as soon as it is copied.
+        """
+        
+        copied = []
+        for i, src, dst, st, reflink in files:
+            copied.append((i, Task._copy_file_with_metadata(src, dst, st, reflink, options, i), st.size))
+            if progress is not None:
+                progress.advance(1, st.size)
+        return copied
+    
+    @staticmethod
+    def _copy_file_with_metadata(src: Path, dst: Path, st: _FileStat, reflink: str = "never", options: _CopyOptions = _CopyOptions(), index: int = 0) -> str:
+        """
+        Copy a file like `shutil.copy2`, but take the metadata from the stat captured by the walk
+        instead of stat-ing the source again, at the level of `options.metadata`. Return the name
+        of the engine that copied the data.
+        
+        With `options.atomic`, the file is written under a temporary name in the same directory, built from its `index`
+        in the plan so that it is unique and never longer than a valid name, and only renamed to `dst` once its data
+        and metadata are complete.
+        """
+        
+        target = dst.with_name(f".fcopy-part-{index}") if options.atomic else dst
+        used = _copy_file_data(src, target, st, reflink, options)
+        if options.metadata != "data":
+            Task._copy_metadata(src, target, st, options.metadata)
+        if options.atomic:
+            os.replace(target, dst)
+        log.debug("Copied %s with %s", src, used)
+        return used
+    
+    def _apply_metadata(self, indexes: Sequence[int], level: str, workers: int, written: set[int] | None = None) -> None:
+        """
+        The metadata phase: apply the metadata of the files at `indexes` with a pool of `workers` threads,
+        then restore the directories of the plan bottom-up, children before their parent, now that their content is written.
+        A directory is stat-ed here, the walk never does.
+        
+        Only the directories that were created, or that files (in `written`, those of the plan by default) or created
+        directories were written into, are restored: a directory left untouched by an incremental task keeps its
+        metadata, so re-running it on an unchanged tree costs nothing here.
+        """
+        
+        if level == "data":
+            return
+        
+        plan = self.plan
+        if indexes:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                batches = self._metadata_batches(indexes)
+                results = _imap_scheduled(self._copy_metadata_batch, {None: (executor, workers * 4, ((batch, level) for batch in batches))})
+                _flush_log_listener()
+                for _ in track((None for count in results for _ in range(count)), total=len(indexes), description="Applying metadata..."):
+                    pass
+        
+        written = set(plan.file_dir) if written is None else written
+        written.update(plan.dir_parent[d] for d in plan.planned)
+        
+        # The destination of a single file task is not a copy of a source directory.
+        file_tasks = {i for i in range(self.task_count) if self.src_base[i] != self.src_list[i].absolute()}
+        for d in reversed(range(len(plan.dir_parent))):
+            state = plan.dir_state[d]
+            if state == _Plan.LISTED or (state == _Plan.EXISTING and d not in written) or (plan.dir_parent[d] < 0 and plan.dir_task[d] in file_tasks):
+                continue
+            
+            src_dir = plan.directory_src(d)
+            try:
+                st = _FileStat.of(os.stat(src_dir))
+            except FileNotFoundError:
+                log.warning(f"Source directory {src_dir} vanished. Skipping...")
+                continue
+            Task._copy_metadata(src_dir, plan.directory_dst(d), st, level)
+    
+    def _metadata_batches(self, indexes: Iterable[int]) -> Iterator[list[tuple[str, str, list[tuple[str, _FileStat]]]]]:
+        """
+        Batch the files for the metadata phase, grouped by directory: each batch holds up to `__COPY_BATCH_SIZE`
+        files, as `(source directory, destination directory, [(name, stat), ...])`.
+        """
+        
+        plan = self.plan
+        batch: list[tuple[str, str, list[tuple[str, _FileStat]]]] = []
+        size, directory = 0, -1
+        for i in indexes:
+            if size >= self.__COPY_BATCH_SIZE:
+                yield batch
+                batch, size, directory = [], 0, -1
+            
+            if plan.file_dir[i] != directory:
+                directory = plan.file_dir[i]
+                batch.append((str(plan.directory_src(directory)), str(plan.directory_dst(directory)), []))
+            
+            batch[-1][2].append((plan.file_name[i], plan.file_stat(i)))
+            size += 1
+        
+        if batch:
+            yield batch
+    
+    @staticmethod
+    def _copy_metadata_batch(batch: list[tuple[str, str, list[tuple[str, _FileStat]]]], level: str) -> int:
+        """
+        Apply the metadata of a batch of files. Each destination directory is opened once and its files are
+        updated by name relative to it, instead of resolving the full path of every file again.
+        """
+        
+        if not {os.utime, os.chmod} <= os.supports_dir_fd:
+            for src_dir, dst_dir, files in batch:
+                for name, st in files:
+                    Task._copy_metadata(os.path.join(src_dir, name), os.path.join(dst_dir, name), st, level)
+            return sum(len(files) for _, _, files in batch)
+        
+        count = 0
+        for src_dir, dst_dir, files in batch:
+            dir_fd = os.open(dst_dir, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                for name, st in files:
+                    os.utime(name, ns=(st.atime_ns, st.mtime_ns), dir_fd=dir_fd)
+                    if level == "full":
+                        Task._copy_xattrs(os.path.join(src_dir, name), os.path.join(dst_dir, name))
+                    os.chmod(name, stat.S_IMODE(st.mode), dir_fd=dir_fd)
+            finally:
+                os.close(dir_fd)
+            count += len(files)
+        return count
+    
+    @staticmethod
+    def _copy_metadata(src: Path, dst: Path, st: _FileStat, level: str = "full") -> None:
+        os.utime(dst, ns=(st.atime_ns, st.mtime_ns))
+        if level == "full":
+            Task._copy_xattrs(src, dst)
+        os.chmod(dst, stat.S_IMODE(st.mode))
+    
+    @staticmethod
+    def _copy_xattrs(src: Path, dst: Path) -> None:
+        """
+        Copy the extended attributes, ignoring the same errors as `shutil.copystat` does.
+        """
+        
+        if not hasattr(os, "listxattr"):
+            return
+        
+        try:
+            names = os.listxattr(src)
+        except OSError as e:
+            if e.errno not in (errno.ENOTSUP, errno.ENODATA, errno.EINVAL):
+                raise
+            return
+        
+        for name in names:
+            try:
+                os.setxattr(dst, name, os.getxattr(src, name))
+            except OSError as e:
+                if e.errno not in (errno.EPERM, errno.ENOTSUP, errno.ENODATA, errno.EINVAL):
+                    raise
     
 
 # ============================================================
@@ -233,5 +2127,5 @@ class Task:
 #     .prepare()
 #     .validate()
 #     .summary()
-#     .execute()
+#     .execute(workers=8)
 # )
\ No newline at end of file